@@ -4,27 +4,52 @@
 from __future__ import annotations
 
 import json
+import os
 import random
 import sys
 import time
 from pathlib import Path
 
+from signal_event_store import json_dumpb
+
 AUTH_FILE = Path("/home/james/.openclaw/workspace-sigpro/.openclaw/auth_state.json")
+AUTH_FAILURE_LOG = AUTH_FILE.parent / "auth_failures.log"
 EXPIRY_SEC = 300  # 5 minutes
 
 
+# Parsed AUTH_FILE keyed by (st_mtime_ns, st_size), for in-process callers.
+_state_cache: tuple[tuple[int, int], dict] | None = None
+
+# Append-only fd for AUTH_FAILURE_LOG; see _failure_log_fd().
+_failure_log_fd_cache: int | None = None
+
+
+def _stat_key() -> tuple[int, int]:
+    st = AUTH_FILE.stat()
+    return st.st_mtime_ns, st.st_size
+
+
 def load_state() -> dict:
-    if not AUTH_FILE.exists():
+    global _state_cache
+    try:
+        key = _stat_key()
+    except OSError:
         return {}
+    if _state_cache is not None and _state_cache[0] == key:
+        return dict(_state_cache[1])
     try:
-        return json.loads(AUTH_FILE.read_text())
+        state = json.loads(AUTH_FILE.read_text())
     except (json.JSONDecodeError, OSError):
         return {}
+    _state_cache = (key, state)
+    return dict(state)
 
 
 def save_state(state: dict) -> None:
+    global _state_cache
     AUTH_FILE.parent.mkdir(parents=True, exist_ok=True)
     AUTH_FILE.write_text(json.dumps(state))
+    _state_cache = (_stat_key(), dict(state))
 
 
 def generate() -> str:
@@ -50,6 +75,21 @@ def validate(submitted_code: str) -> tuple[bool, str]:
     return False, "Code mismatch."
 
 
+def _failure_log_fd() -> int:
+    # Opened once and kept for the life of the process; O_APPEND makes each
+    # single-write log line atomic even with other processes appending.
+    global _failure_log_fd_cache
+    if _failure_log_fd_cache is None:
+        AUTH_FAILURE_LOG.parent.mkdir(parents=True, exist_ok=True)
+        _failure_log_fd_cache = os.open(AUTH_FAILURE_LOG, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+    return _failure_log_fd_cache
+
+
+def log_failure(reason: str, code: str | None = None, message_id: str | None = None) -> None:
+    entry = {"ts": int(time.time()), "reason": reason, "code": code, "message_id": message_id}
+    os.write(_failure_log_fd(), json_dumpb(entry) + b"\n")
+
+
 def usage() -> None:
     print("Usage: auth_manager.py generate | validate <code>")
 
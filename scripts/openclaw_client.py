@@ -0,0 +1,277 @@
+"""Shared OpenClaw access for SigPro scripts.
+
+Requests go to a long-running OpenClaw sidecar over a Unix domain socket using
+line-delimited JSON ({"method": ..., "params": {...}}\n -> one JSON line back).
+When no sidecar socket is reachable, calls fall back to the `openclaw` CLI.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import shutil
+import socket
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from rate_limit import TokenBucket, TransientError, retry
+from signal_event_store import json_dumpb, json_loads
+
+SOCKET_PATH = Path(
+    os.environ.get("OPENCLAW_SOCKET")
+    or Path(os.environ.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}") / "openclaw.sock"
+)
+
+# Agent payload fields that may hold reply text, in priority order, and
+# replies that only acknowledge the run rather than answer it.
+TEXT_KEYS = ("final", "reply", "text", "message", "content", "output")
+PLACEHOLDER_TEXTS = {"execution completed.", "execution completed"}
+
+# Outbound pacing: per-channel message sends, session posts and agent runs.
+SEND_RATE_PER_SEC = 1.0
+SEND_BURST = 5
+AGENT_RATE_PER_SEC = 0.2
+AGENT_BURST = 2
+
+_send_buckets: dict[str, TokenBucket] = {}
+_agent_bucket = TokenBucket(AGENT_RATE_PER_SEC, AGENT_BURST)
+
+
+def _send_bucket(channel: str) -> TokenBucket:
+    bucket = _send_buckets.get(channel)
+    if bucket is None:
+        bucket = _send_buckets.setdefault(channel, TokenBucket(SEND_RATE_PER_SEC, SEND_BURST))
+    return bucket
+
+
+def rpc(method: str, params: dict[str, Any], timeout: float = 30.0) -> dict[str, Any] | None:
+    """Send one request to the sidecar; returns None only if it could not be reached.
+
+    Once the request has been sent, failures are reported as {"ok": False} rather
+    than None so callers never replay a possibly-delivered request via the CLI.
+    The one exception is a response marked {"retryable": true} (optionally with
+    "retry_after" seconds): the sidecar uses it when it rejected the request
+    without acting on it, e.g. when throttled, so it is resent with backoff.
+    """
+    try:
+        return _rpc_once(method, params, timeout)
+    except TransientError as e:
+        return e.result
+
+
+@retry()
+def _rpc_once(method: str, params: dict[str, Any], timeout: float) -> dict[str, Any] | None:
+    if not SOCKET_PATH.exists():
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(SOCKET_PATH))
+        except OSError:
+            return None
+
+        try:
+            sock.sendall(json_dumpb({"method": method, "params": params}) + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+            resp = json_loads(line)
+        except (OSError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+    finally:
+        sock.close()
+
+    if not isinstance(resp, dict):
+        return {"ok": False, "error": "invalid sidecar response"}
+    if resp.get("retryable"):
+        retry_after = resp.get("retry_after")
+        raise TransientError(
+            str(resp.get("error") or "sidecar asked to retry"),
+            retry_after=float(retry_after) if isinstance(retry_after, (int, float)) else None,
+            result=resp,
+        )
+    return resp
+
+
+@functools.lru_cache(maxsize=None)
+def _openclaw_bin() -> str:
+    return shutil.which("openclaw") or "openclaw"
+
+
+def _cli_ok(args: list[str]) -> bool:
+    # An absolute executable path plus close_fds=False lets CPython launch via
+    # posix_spawn rather than fork+exec. Leaving fds open is safe: descriptors
+    # Python creates (sockets, the SQLite DB) are non-inheritable by default.
+    # Fire-and-forget commands only need the exit status, so output goes to
+    # /dev/null instead of through capture pipes.
+    proc = subprocess.run(
+        [_openclaw_bin(), *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=False
+    )
+    return proc.returncode == 0
+
+
+def _cli_json_stream(
+    args: list[str], timeout_sec: float, accept: Callable[[Any], bool] | None
+) -> tuple[bool, Any]:
+    """Run a CLI command that prints JSON and parse its stdout as it arrives.
+
+    Each unindented line starting with "{" is tried as its own document
+    (NDJSON). If no line parses, the whole output is parsed once at EOF, so a
+    single pretty-printed document still works. Once `accept` approves a
+    document it is returned immediately; the process is left to finish and is
+    reaped in the background rather than killed mid-run.
+    """
+    proc = subprocess.Popen(
+        [_openclaw_bin(), *args], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, close_fds=False
+    )
+    timer = threading.Timer(timeout_sec, proc.kill)
+    timer.start()
+    payload = None
+    chunks: list[bytes] = []
+    for line in proc.stdout:
+        chunks.append(line)
+        if not line.startswith(b"{"):
+            continue
+        try:
+            payload = json_loads(line)
+        except ValueError:
+            continue
+        if accept is not None and accept(payload):
+            # Non-daemon, so a one-shot run still waits for the agent to exit
+            # instead of closing its stdout pipe underneath it.
+            threading.Thread(target=_drain_and_reap, args=(proc, timer)).start()
+            return True, payload
+
+    _drain_and_reap(proc, timer)
+    if proc.returncode != 0:
+        return False, None
+    if payload is None:
+        try:
+            payload = json_loads(b"".join(chunks))
+        except ValueError:
+            pass
+    return True, payload
+
+
+def _drain_and_reap(proc: subprocess.Popen[bytes], timer: threading.Timer) -> None:
+    for _ in proc.stdout:
+        pass
+    proc.stdout.close()
+    proc.wait()
+    timer.cancel()
+
+
+def send_message(channel: str, target: str, text: str) -> bool:
+    _send_bucket(channel).take()
+    return _send_message(channel, target, text)
+
+
+def _send_message(channel: str, target: str, text: str) -> bool:
+    resp = rpc("message.send", {"channel": channel, "target": target, "message": text})
+    if resp is not None:
+        return bool(resp.get("ok"))
+
+    return _cli_ok(["message", "send", "--channel", channel, "--target", target, "--message", text])
+
+
+def send_bulk(messages: list[tuple[str, str, str]]) -> list[bool]:
+    """Send several (channel, target, text) messages at once; returns per-message success."""
+    for channel, _, _ in messages:
+        _send_bucket(channel).take()
+    resp = rpc(
+        "message.send.bulk",
+        {"messages": [{"channel": c, "target": t, "message": m} for c, t, m in messages]},
+    )
+    if resp is not None:
+        results = resp.get("results")
+        if isinstance(results, list) and len(results) == len(messages):
+            return [bool(r.get("ok")) if isinstance(r, dict) else bool(r) for r in results]
+        if resp.get("ok"):
+            return [True] * len(messages)
+
+    # No sidecar, or it rejected the bulk call (e.g. an older sidecar without
+    # the method): the CLI has no bulk verb, so run the sends side by side.
+    with ThreadPoolExecutor(max_workers=len(messages) or 1) as pool:
+        return list(pool.map(lambda msg: _send_message(*msg), messages))
+
+
+def send_to_session(label: str, message: str) -> bool:
+    _send_bucket("sessions").take()
+    resp = rpc("sessions.send", {"label": label, "message": message})
+    if resp is not None:
+        return bool(resp.get("ok"))
+
+    return _cli_ok(["sessions", "send", "--label", label, "--message", message])
+
+
+def run_agent(
+    agent: str, message: str, timeout_sec: int = 120, accept: Callable[[Any], bool] | None = None
+) -> tuple[bool, Any]:
+    """Run one agent turn; returns (completed, payload) with payload None if unparseable.
+
+    With the CLI fallback, `accept` is checked against each JSON document the
+    agent streams, and the first one it approves is returned without waiting
+    for the run to exit.
+    """
+    _agent_bucket.take()
+    resp = rpc("agent.run", {"agent": agent, "message": message, "timeout": timeout_sec}, timeout=timeout_sec + 10)
+    if resp is not None:
+        return bool(resp.get("ok")), resp.get("result")
+
+    return _cli_json_stream(
+        ["agent", "--agent", agent, "--message", message, "--json", "--timeout", str(timeout_sec)],
+        timeout_sec + 10,
+        accept,
+    )
+
+
+def iter_text_candidates(obj: Any) -> Iterator[str]:
+    """Yield non-empty TEXT_KEYS strings from an agent payload in pre-order.
+
+    Uses an explicit stack (no RecursionError on deep payloads); children are
+    pushed in reverse so the order matches a recursive walk.
+    """
+    stack: list[Any] = [obj]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, dict):
+            for k in TEXT_KEYS:
+                val = v.get(k)
+                if isinstance(val, str) and val.strip():
+                    yield val.strip()
+            stack.extend(reversed(v.values()))
+        elif isinstance(v, list):
+            stack.extend(reversed(v))
+
+
+def best_assistant_text(payload: dict[str, Any]) -> str:
+    # Prefer top-level canonical fields first.
+    for k in ("final", "reply", "text", "message"):
+        v = payload.get(k)
+        if isinstance(v, str) and v.strip():
+            return v.strip()
+
+    # Then scan nested payload for any textual content, stopping at the first hit.
+    first = ""
+    for c in iter_text_candidates(payload):
+        if c.lower() not in PLACEHOLDER_TEXTS:
+            return c
+        first = first or c
+
+    return first
+
+
+def has_final_text(payload: Any) -> bool:
+    # Lets a streamed agent run stop reading at its answer. Only an explicit
+    # top-level final/reply counts; progress events also carry text/message.
+    if not isinstance(payload, dict):
+        return False
+    for k in ("final", "reply"):
+        v = payload.get(k)
+        if isinstance(v, str) and v.strip() and v.strip().lower() not in PLACEHOLDER_TEXTS:
+            return True
+    return False
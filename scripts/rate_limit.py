@@ -0,0 +1,96 @@
+"""Pacing and retry helpers for outbound provider calls (OpenClaw sends, ElevenLabs)."""
+
+from __future__ import annotations
+
+import functools
+import random
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Allow bursts of up to `capacity` calls, refilled at `rate` tokens per second.
+
+    take() blocks until a token is available rather than failing, so callers
+    stay under a provider's limit instead of tripping 429s and backing off.
+    Safe to share between threads.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n: float = 1) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # Reserve the tokens now (possibly going negative) so concurrent
+            # callers queue up behind each other instead of all waking at once.
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class TransientError(Exception):
+    """A failure that is safe to retry (throttling, 5xx, dropped connection).
+
+    `retry_after` is the server-requested wait in seconds, if any; `result` is
+    what the caller should fall back to once retries are exhausted.
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None, result: Any = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.result = result
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    # Only the delta-seconds form is honoured; an HTTP-date falls back to backoff.
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def retry(
+    max_attempts: int = 4,
+    base: float = 0.5,
+    max_delay: float = 8.0,
+    max_retry_after: float = 60.0,
+    retry_on: tuple[type[BaseException], ...] = (TransientError,),
+) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Retry on `retry_on` with jittered exponential backoff; re-raises the last error.
+
+    A `retry_after` attribute on the exception (see TransientError) replaces the
+    backoff delay for that attempt, capped at `max_retry_after`.
+    """
+
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            delay = base
+            attempt = 1
+            while True:
+                try:
+                    return fn(*args, **kwargs)
+                except retry_on as e:
+                    if attempt >= max_attempts:
+                        raise
+                    wait = getattr(e, "retry_after", None)
+                    if wait is None:
+                        wait = delay + random.uniform(0, delay)
+                    time.sleep(min(wait, max_retry_after))
+                    delay = min(delay * 2, max_delay)
+                    attempt += 1
+
+        return wrapper
+
+    return decorator
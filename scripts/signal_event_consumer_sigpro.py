@@ -4,30 +4,53 @@
 Consumes events published by signal_inbound_collector.py and applies:
 - New voice attachment -> transcribe + OOB auth flow
 - 4-digit text code -> validate + execute pending transcript
+
+Runs one batch and exits by default; with --follow it stays up and wakes as
+soon as the collector commits new events.
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
-import subprocess
+import signal
 import time
 from pathlib import Path
 from typing import Any
 
-from signal_event_store import DEFAULT_DB, fetch_events, get_conn, get_offset, init_db, set_offset
+import auth_manager
+import openclaw_client
+import transcribe_elevenlabs
+from signal_event_store import (
+    DEFAULT_DB,
+    close_conn,
+    data_version,
+    fetch_events,
+    get_conn,
+    get_offset,
+    init_db,
+    json_dumpb,
+    json_loads,
+    set_offset,
+    wait_for_change,
+)
 
 VOICE_EXTENSIONS = {".m4a", ".opus", ".ogg", ".oga", ".aac", ".mp3", ".wav", ".webm"}
+_VOICE_SUFFIX_TUPLE = tuple(VOICE_EXTENSIONS)
 TARGET_USER = "+19412907826"
 CODE_RE = re.compile(r"^\s*(\d{4})\s*$")
 
 STATE_DIR = Path("/home/james/.openclaw/workspace-sigpro/.openclaw")
 PENDING_FILE = STATE_DIR / "pending_transcript.json"
-AUTH_FAILURE_LOG = STATE_DIR / "auth_failures.log"
 
-TRANSCRIBE_SCRIPT = Path("/home/james/.openclaw/workspace-sigpro/scripts/transcribe_elevenlabs.py")
-AUTH_SCRIPT = Path("/home/james/.openclaw/workspace-sigpro/scripts/auth_manager.py")
+
+# Parsed PENDING_FILE keyed by (st_mtime_ns, st_size); see _load_pending().
+_pending_cache: tuple[tuple[int, int], dict[str, Any]] | None = None
+
+# Safety net for --follow: rescan even if no DB change was observed.
+FALLBACK_POLL_SEC = 30.0
 
 
 def parse_args() -> argparse.Namespace:
@@ -35,125 +58,48 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--db", default=str(DEFAULT_DB), help="SQLite DB path")
     p.add_argument("--consumer", default="sigpro-main", help="Consumer offset name")
     p.add_argument("--limit", type=int, default=100, help="Max events to process this run")
+    p.add_argument("--follow", action="store_true", help="Keep running and wake on new events")
+    p.add_argument("--poll-ms", type=int, default=200, help="DB change check interval in ms for --follow")
     return p.parse_args()
 
 
-def _run(cmd: list[str]) -> subprocess.CompletedProcess[str]:
-    return subprocess.run(cmd, capture_output=True, text=True)
-
-
 def _send_message(channel: str, target: str, text: str) -> bool:
-    proc = _run([
-        "openclaw",
-        "message",
-        "send",
-        "--channel",
-        channel,
-        "--target",
-        target,
-        "--message",
-        text,
-    ])
-    return proc.returncode == 0
-
-
-def _log_auth_failure(reason: str, code: str | None = None, message_id: str | None = None) -> None:
-    STATE_DIR.mkdir(parents=True, exist_ok=True)
-    entry = {"ts": int(time.time()), "reason": reason, "code": code, "message_id": message_id}
-    with AUTH_FAILURE_LOG.open("a") as f:
-        f.write(json.dumps(entry) + "\n")
+    return openclaw_client.send_message(channel, target, text)
 
 
 def _transcribe(path: Path) -> str | None:
-    proc = _run(["python3", str(TRANSCRIBE_SCRIPT), str(path)])
-    if proc.returncode != 0:
-        return None
-    out_path = Path(proc.stdout.strip())
-    if not out_path.exists():
+    try:
+        _, text = transcribe_elevenlabs.transcribe(path)
+    except (transcribe_elevenlabs.TranscriptionError, OSError):
         return None
-    text = out_path.read_text().strip()
-    return text or None
+    return text.strip() or None
 
 
 def _generate_auth_code() -> str | None:
-    proc = _run(["python3", str(AUTH_SCRIPT), "generate"])
-    code = proc.stdout.strip()
-    if proc.returncode != 0 or not re.fullmatch(r"\d{4}", code):
+    try:
+        code = auth_manager.generate()
+    except OSError:
         return None
-    return code
+    return code if re.fullmatch(r"\d{4}", code) else None
 
 
 def _validate_code(code: str) -> tuple[bool, str]:
-    proc = _run(["python3", str(AUTH_SCRIPT), "validate", code])
-    if proc.returncode != 0:
-        return False, "Internal validation error."
     try:
-        payload = json.loads(proc.stdout.strip())
-    except json.JSONDecodeError:
-        return False, "Internal validation parse error."
-    return bool(payload.get("ok")), str(payload.get("message") or "Invalid code.")
-
-
-def _extract_text_candidates(obj: Any) -> list[str]:
-    out: list[str] = []
-
-    def walk(v: Any) -> None:
-        if isinstance(v, dict):
-            for k in ("final", "reply", "text", "message", "content", "output"):
-                val = v.get(k)
-                if isinstance(val, str) and val.strip():
-                    out.append(val.strip())
-            for _, child in v.items():
-                walk(child)
-        elif isinstance(v, list):
-            for item in v:
-                walk(item)
-
-    walk(obj)
-    # preserve order, remove duplicates
-    dedup: list[str] = []
-    seen: set[str] = set()
-    for s in out:
-        if s not in seen:
-            seen.add(s)
-            dedup.append(s)
-    return dedup
-
-
-def _best_assistant_text(payload: dict[str, Any]) -> str:
-    # Prefer top-level canonical fields first.
-    for k in ("final", "reply", "text", "message"):
-        v = payload.get(k)
-        if isinstance(v, str) and v.strip():
-            return v.strip()
-
-    # Then scan nested payload for any textual content.
-    candidates = _extract_text_candidates(payload)
-    for c in candidates:
-        if c.lower() not in {"execution completed.", "execution completed"}:
-            return c
-
-    return candidates[0] if candidates else ""
+        return auth_manager.validate(code)
+    except OSError:
+        return False, "Internal validation error."
 
 
 def _execute_in_main(transcript: str) -> str:
     text = f"SigPro Authorized Signal Voice Request:\n{transcript}"
-    proc = _run([
-        "openclaw", "agent",
-        "--agent", "main",
-        "--message", text,
-        "--json",
-        "--timeout", "120",
-    ])
-    if proc.returncode != 0:
+    ok, payload = openclaw_client.run_agent("main", text, timeout_sec=120, accept=openclaw_client.has_final_text)
+    if not ok:
         return "Execution was triggered, but no assistant output was returned."
 
-    try:
-        payload = json.loads(proc.stdout)
-    except json.JSONDecodeError:
+    if not isinstance(payload, dict):
         return "Execution completed, but assistant output could not be parsed."
 
-    assistant_text = _best_assistant_text(payload)
+    assistant_text = openclaw_client.best_assistant_text(payload)
     if not assistant_text:
         return "Execution completed, but no assistant text was returned."
 
@@ -169,14 +115,26 @@ def _store_pending_transcript(transcript: str, source_file: str, source_message_
         "created_at": int(time.time()),
         "expires_in_sec": 300,
     }
-    PENDING_FILE.write_text(json.dumps(payload, indent=2))
+    PENDING_FILE.write_bytes(json_dumpb(payload))
 
 
-def handle_voice_event(row) -> None:
-    attachments = json.loads(row["attachments_json"])
-    if not attachments:
-        return
+def _load_pending() -> dict[str, Any]:
+    # A stat is enough to tell whether the file changed since the last parse.
+    global _pending_cache
+    st = os.stat(PENDING_FILE)
+    key = (st.st_mtime_ns, st.st_size)
+    if _pending_cache is None or _pending_cache[0] != key:
+        _pending_cache = (key, json_loads(PENDING_FILE.read_bytes()))
+    return _pending_cache[1]
+
+
+def _clear_pending() -> None:
+    global _pending_cache
+    PENDING_FILE.unlink(missing_ok=True)
+    _pending_cache = None
+
 
+def handle_voice_event(row, attachments: list[dict[str, Any]]) -> None:
     # only one pending request at a time in phase-1
     if PENDING_FILE.exists():
         return
@@ -184,10 +142,9 @@ def handle_voice_event(row) -> None:
     for a in attachments:
         path = a.get("path")
         filename = a.get("filename") or ""
-        suffix = Path(filename).suffix.lower() if filename else Path(path or "").suffix.lower()
-        if suffix not in VOICE_EXTENSIONS:
+        if not (filename or path or "").lower().endswith(_VOICE_SUFFIX_TUPLE):
             continue
-        if not path or not Path(path).exists():
+        if not path or not os.path.isfile(path):
             continue
 
         transcript = _transcribe(Path(path))
@@ -196,40 +153,38 @@ def handle_voice_event(row) -> None:
 
         code = _generate_auth_code()
         if not code:
-            _log_auth_failure("code_generation_failed", message_id=row["source_message_id"])
+            auth_manager.log_failure("code_generation_failed", message_id=row["source_message_id"])
             return
 
-        _store_pending_transcript(transcript, filename or Path(path).name, row["source_message_id"])
-        _send_message("whatsapp", TARGET_USER, f"SigPro Auth Code: {code} (Valid for 5 mins for your Signal voice request)")
-        _send_message("signal", TARGET_USER, "Voice request transcribed. Please enter the 4-digit code sent to your WhatsApp to authorize execution.")
+        _store_pending_transcript(transcript, filename or os.path.basename(path), row["source_message_id"])
+        messages = [
+            ("whatsapp", TARGET_USER, f"SigPro Auth Code: {code} (Valid for 5 mins for your Signal voice request)"),
+            ("signal", TARGET_USER, "Voice request transcribed. Please enter the 4-digit code sent to your WhatsApp to authorize execution."),
+        ]
+        for (channel, _, _), sent in zip(messages, openclaw_client.send_bulk(messages)):
+            if not sent:
+                auth_manager.log_failure(f"notify_failed:{channel}", code=code, message_id=row["source_message_id"])
         return
 
 
-def handle_code_event(row) -> None:
+def handle_code_event(row, code: str) -> None:
     if not PENDING_FILE.exists():
         return
 
-    msg = json.loads(row["message_json"])
-    text = str(msg.get("text") or "")
-    m = CODE_RE.match(text)
-    if not m:
-        return
-
-    code = m.group(1)
     ok, reason = _validate_code(code)
     if not ok:
-        _log_auth_failure(reason, code=code, message_id=row["source_message_id"])
+        auth_manager.log_failure(reason, code=code, message_id=row["source_message_id"])
         _send_message("signal", TARGET_USER, f"Auth failed: {reason}")
         return
 
     try:
-        pending = json.loads(PENDING_FILE.read_text())
+        pending = _load_pending()
         transcript = str(pending.get("transcript") or "").strip()
     except Exception:
         transcript = ""
 
     if not transcript:
-        _log_auth_failure("pending_transcript_missing_or_invalid", code=code, message_id=row["source_message_id"])
+        auth_manager.log_failure("pending_transcript_missing_or_invalid", code=code, message_id=row["source_message_id"])
         _send_message("signal", TARGET_USER, "Auth accepted, but no pending transcript was found.")
         return
 
@@ -240,11 +195,11 @@ def handle_code_event(row) -> None:
         f"🤖 Assistant Output:\n{summary}"
     )
     _send_message("signal", TARGET_USER, formatted[:3500])
-    PENDING_FILE.unlink(missing_ok=True)
+    _clear_pending()
 
 
 def is_from_target_sender(row) -> bool:
-    sender = json.loads(row["sender_json"])
+    sender = json_loads(row["sender_json"])
     sid = str(sender.get("id") or "").strip()
     if sid == TARGET_USER:
         return True
@@ -256,32 +211,72 @@ def is_from_target_sender(row) -> bool:
     if not sid:
         if not PENDING_FILE.exists():
             return False
-        msg = json.loads(row["message_json"])
+        msg = json_loads(row["message_json"])
         text = str(msg.get("text") or "").strip()
         return bool(CODE_RE.match(text))
 
     return False
 
 
+def handle_event(row) -> None:
+    # A row is either a voice attachment or a text code, so decode only the
+    # column that decides which, and hand the parsed value to the handler.
+    attachments = json_loads(row["attachments_json"])
+    if attachments:
+        handle_voice_event(row, attachments)
+        return
+
+    msg = json_loads(row["message_json"])
+    m = CODE_RE.match(str(msg.get("text") or ""))
+    if m:
+        handle_code_event(row, m.group(1))
+
+
+def consume_batch(conn, consumer: str, limit: int) -> int:
+    offset = get_offset(conn, consumer)
+    rows = fetch_events(conn, offset, limit=limit)
+
+    # Commit the cursor once per batch rather than per row; the finally block
+    # still records progress up to the last handled row if a handler raises.
+    last_offset = offset
+    try:
+        for row in rows:
+            if is_from_target_sender(row):
+                handle_event(row)
+            last_offset = row["id"]
+    finally:
+        if last_offset != offset:
+            set_offset(conn, consumer, last_offset)
+
+    return len(rows)
+
+
+def _exit_on_sigterm(signum: int, frame: Any) -> None:
+    # systemd stops --follow with SIGTERM; raising SystemExit unwinds through
+    # consume_batch's finally so the offset of rows already handled is saved.
+    raise SystemExit(128 + signum)
+
+
 def main() -> int:
     args = parse_args()
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
     conn = get_conn(Path(args.db))
     init_db(conn)
 
-    offset = get_offset(conn, args.consumer)
-    rows = fetch_events(conn, offset, limit=args.limit)
-
-    for row in rows:
-        if not is_from_target_sender(row):
-            set_offset(conn, args.consumer, row["id"])
-            continue
-
-        handle_voice_event(row)
-        handle_code_event(row)
-        set_offset(conn, args.consumer, row["id"])
-
-    print(json.dumps({"processed": len(rows), "last_offset": get_offset(conn, args.consumer)}))
-    return 0
+    if not args.follow:
+        processed = consume_batch(conn, args.consumer, args.limit)
+        print(json.dumps({"processed": processed, "last_offset": get_offset(conn, args.consumer)}))
+        close_conn(conn)
+        return 0
+
+    # Read the version before consuming so commits that land mid-batch wake us.
+    version = data_version(conn)
+    while True:
+        processed = consume_batch(conn, args.consumer, args.limit)
+        if processed:
+            print(json.dumps({"processed": processed, "last_offset": get_offset(conn, args.consumer)}), flush=True)
+        if processed < args.limit:
+            version = wait_for_change(conn, version, args.poll_ms, FALLBACK_POLL_SEC)
 
 
 if __name__ == "__main__":
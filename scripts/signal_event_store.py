@@ -9,18 +9,61 @@ import time
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback when orjson is not installed
+    orjson = None
+
 DEFAULT_DB = Path("/home/james/.openclaw/workspace-sigpro/.openclaw/signal_events.db")
 
 
+def json_loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumpb(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_dumps(obj: Any) -> str:
+    return json_dumpb(obj).decode("utf-8")
+
+
 def get_conn(db_path: Path = DEFAULT_DB) -> sqlite3.Connection:
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(db_path))
+    # sqlite3 keeps prepared statements keyed by SQL text; every hot query here
+    # uses constant text, so they are planned once per connection and reused.
+    conn = sqlite3.connect(str(db_path), cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # page_size only takes effect on a fresh DB, so it must precede the WAL
+    # switch (the first write); on existing DBs it is a no-op.
+    conn.execute("PRAGMA page_size=8192")
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA wal_autocheckpoint=10000")
+    conn.execute("PRAGMA cache_size=-32000")
     return conn
 
 
+def close_conn(conn: sqlite3.Connection) -> None:
+    # Refresh query-planner stats for tables that changed, then close.
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+
+# Compact JSON bytes (json_dumpb) of the columns consumers decode on every
+# event. sqlite hands BLOBs back as bytes, which json_loads parses directly,
+# with no str round trip. The TEXT *_json columns are still written for
+# readers that have not moved over.
+BLOB_COLUMNS = ("sender_mp", "message_mp", "attachments_mp")
+
+
 def init_db(conn: sqlite3.Connection) -> None:
     conn.executescript(
         """
@@ -36,7 +79,10 @@ def init_db(conn: sqlite3.Connection) -> None:
             message_json TEXT NOT NULL,
             attachments_json TEXT NOT NULL,
             raw_json TEXT NOT NULL,
-            created_at INTEGER NOT NULL
+            created_at INTEGER NOT NULL,
+            sender_mp BLOB,
+            message_mp BLOB,
+            attachments_mp BLOB
         );
 
         CREATE INDEX IF NOT EXISTS idx_signal_events_received_at ON signal_events(received_at);
@@ -49,43 +95,74 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    # Databases created before the BLOB columns existed get them added; their
+    # old rows keep NULL there and are read from the TEXT columns instead.
+    have = {row[1] for row in conn.execute("PRAGMA table_info(signal_events)")}
+    for col in BLOB_COLUMNS:
+        if col not in have:
+            conn.execute(f"ALTER TABLE signal_events ADD COLUMN {col} BLOB")
     conn.commit()
 
 
-def publish_event(conn: sqlite3.Connection, event: dict[str, Any]) -> bool:
-    now = int(time.time())
-    payload = {
+INSERT_EVENT_SQL = """
+    INSERT INTO signal_events (
+        event_id, source, account, received_at, source_message_id,
+        chat_json, sender_json, message_json, attachments_json, raw_json, created_at,
+        sender_mp, message_mp, attachments_mp
+    ) VALUES (
+        :event_id, :source, :account, :received_at, :source_message_id,
+        :chat_json, :sender_json, :message_json, :attachments_json, :raw_json, :created_at,
+        :sender_mp, :message_mp, :attachments_mp
+    )
+    ON CONFLICT(event_id) DO NOTHING
+"""
+
+
+def _event_row(event: dict[str, Any], now: int) -> dict[str, Any]:
+    sender = json_dumpb(event.get("sender", {}))
+    message = json_dumpb(event.get("message", {}))
+    attachments = json_dumpb(event.get("attachments", []))
+    return {
         "event_id": str(event["event_id"]),
         "source": str(event.get("source", "signal")),
         "account": event.get("account"),
         "received_at": int(event.get("received_at", now)),
         "source_message_id": event.get("source_message_id"),
-        "chat_json": json.dumps(event.get("chat", {}), ensure_ascii=False),
-        "sender_json": json.dumps(event.get("sender", {}), ensure_ascii=False),
-        "message_json": json.dumps(event.get("message", {}), ensure_ascii=False),
-        "attachments_json": json.dumps(event.get("attachments", []), ensure_ascii=False),
-        "raw_json": json.dumps(event.get("raw", {}), ensure_ascii=False),
+        "chat_json": json_dumps(event.get("chat", {})),
+        "sender_json": sender.decode("utf-8"),
+        "message_json": message.decode("utf-8"),
+        "attachments_json": attachments.decode("utf-8"),
+        "raw_json": json_dumps(event.get("raw", {})),
         "created_at": now,
+        "sender_mp": sender,
+        "message_mp": message,
+        "attachments_mp": attachments,
     }
 
-    try:
-        conn.execute(
-            """
-            INSERT INTO signal_events (
-                event_id, source, account, received_at, source_message_id,
-                chat_json, sender_json, message_json, attachments_json, raw_json, created_at
-            ) VALUES (
-                :event_id, :source, :account, :received_at, :source_message_id,
-                :chat_json, :sender_json, :message_json, :attachments_json, :raw_json, :created_at
-            )
-            """,
-            payload,
-        )
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        # duplicate event_id
-        return False
+
+def publish_event(conn: sqlite3.Connection, event: dict[str, Any]) -> bool:
+    # RETURNING yields a row only when the insert happened, so duplicates are
+    # detected without an IntegrityError round trip.
+    with conn:
+        rows = conn.execute(INSERT_EVENT_SQL + " RETURNING id", _event_row(event, int(time.time()))).fetchall()
+    return bool(rows)
+
+
+def publish_events(conn: sqlite3.Connection, events: list[dict[str, Any]]) -> tuple[int, int]:
+    """Insert a batch of events in one transaction; returns (published, duplicates)."""
+    if not events:
+        return 0, 0
+
+    now = int(time.time())
+    rows = [_event_row(e, now) for e in events]
+
+    # Duplicate event_ids are skipped by ON CONFLICT DO NOTHING. executemany
+    # discards RETURNING rows, so count the inserts from total_changes instead.
+    before = conn.total_changes
+    with conn:
+        conn.executemany(INSERT_EVENT_SQL, rows)
+    published = conn.total_changes - before
+    return published, len(rows) - published
 
 
 def get_offset(conn: sqlite3.Connection, consumer_name: str) -> int:
@@ -110,10 +187,41 @@ def set_offset(conn: sqlite3.Connection, consumer_name: str, rowid: int) -> None
     conn.commit()
 
 
+# Everything except raw_json: the provider payload is the largest column and
+# only needed for debugging/replay, so consumers don't fetch it. The decoded
+# columns come from the BLOB copies, falling back to TEXT for older rows.
+EVENT_COLUMNS = (
+    "id, event_id, source, account, received_at, source_message_id, chat_json, "
+    "COALESCE(sender_mp, sender_json) AS sender_json, "
+    "COALESCE(message_mp, message_json) AS message_json, "
+    "COALESCE(attachments_mp, attachments_json) AS attachments_json, created_at"
+)
+
+
 def fetch_events(conn: sqlite3.Connection, after_rowid: int, limit: int = 100) -> list[sqlite3.Row]:
     return list(
         conn.execute(
-            "SELECT * FROM signal_events WHERE id > ? ORDER BY id ASC LIMIT ?",
+            f"SELECT {EVENT_COLUMNS} FROM signal_events WHERE id > ? ORDER BY id ASC LIMIT ?",
             (after_rowid, limit),
         ).fetchall()
     )
+
+
+def data_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA data_version").fetchone()[0])
+
+
+def wait_for_change(conn: sqlite3.Connection, last_version: int, poll_ms: int, max_wait_sec: float) -> int:
+    """Block until another connection commits (or max_wait_sec elapses); returns the new data_version.
+
+    sqlite3 update hooks only fire for writes on the same connection, so the
+    collector's inserts are detected via PRAGMA data_version, which changes
+    whenever any other connection commits. Checking it is a cheap header read.
+    """
+    deadline = time.monotonic() + max_wait_sec
+    interval = max(0.01, poll_ms / 1000.0)
+    while True:
+        version = data_version(conn)
+        if version != last_version or time.monotonic() >= deadline:
+            return version
+        time.sleep(interval)
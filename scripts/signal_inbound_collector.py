@@ -17,13 +17,14 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import mmap
 import os
 import sys
 import time
 from pathlib import Path
 from typing import Any, Iterator
 
-from signal_event_store import DEFAULT_DB, get_conn, init_db, publish_event
+from signal_event_store import DEFAULT_DB, close_conn, get_conn, init_db, json_loads, publish_events
 
 STATE_DIR = Path("/home/james/.openclaw/workspace-sigpro/.openclaw")
 LOCK_PATH = STATE_DIR / "signal_inbound.lock"
@@ -72,8 +73,15 @@ def write_offset(path: Path, value: int) -> None:
 
 def stable_event_id(raw_obj: dict[str, Any]) -> str:
     src_id = str(raw_obj.get("source_message_id") or raw_obj.get("id") or "")
+    sender = str(
+        (raw_obj.get("sender") or {}).get("id") or raw_obj.get("sender_id") or raw_obj.get("source") or ""
+    )
+    if src_id:
+        # Signal identifies a message by (sender, timestamp id); hashing just
+        # that keeps the input tiny instead of including the message body.
+        return hashlib.sha256(f"sigv1|{src_id}|{sender}".encode("utf-8")).hexdigest()
+
     ts = str(raw_obj.get("received_at") or raw_obj.get("timestamp") or int(time.time()))
-    sender = str((raw_obj.get("sender") or {}).get("id") or raw_obj.get("sender_id") or "")
     text = str((raw_obj.get("message") or {}).get("text") or raw_obj.get("text") or "")
     seed = "|".join([src_id, ts, sender, text])
     if seed == "|||":
@@ -119,7 +127,7 @@ def iter_jsonl_from_stdin() -> Iterator[dict[str, Any]]:
         if not line:
             continue
         try:
-            obj = json.loads(line)
+            obj = json_loads(line)
             if isinstance(obj, dict):
                 yield obj
         except json.JSONDecodeError:
@@ -127,28 +135,39 @@ def iter_jsonl_from_stdin() -> Iterator[dict[str, Any]]:
 
 
 def ingest_file_once(path: Path, offset_path: Path) -> tuple[list[dict[str, Any]], int]:
-    if not path.exists():
-        return [], read_offset(offset_path)
-
     offset = read_offset(offset_path)
-    size = path.stat().st_size
-    if offset > size:
-        offset = 0  # file rotated/truncated
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return [], offset
 
     out: list[dict[str, Any]] = []
-    with path.open("r", encoding="utf-8") as f:
-        f.seek(offset)
-        for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-                if isinstance(obj, dict):
-                    out.append(obj)
-            except json.JSONDecodeError:
-                print(f"invalid JSONL line skipped: {line[:120]}", file=sys.stderr)
-        new_offset = f.tell()
+    with f:
+        # Size the open file, not the path: a rotation between stat() and
+        # open() would otherwise hand mmap a length the fd cannot back.
+        size = os.fstat(f.fileno()).st_size
+        if offset > size:
+            offset = 0  # file rotated/truncated
+
+        new_offset = offset
+        if size > offset:
+            # Map the file and slice the unread tail directly instead of pulling it
+            # through buffered text IO. Only complete lines are consumed; a partial
+            # trailing line is left for the next pass.
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                end = mm.rfind(b"\n", offset, size) + 1
+                if end:
+                    for raw in mm[offset:end].split(b"\n"):
+                        line = raw.strip()
+                        if not line:
+                            continue
+                        try:
+                            obj = json_loads(line)
+                            if isinstance(obj, dict):
+                                out.append(obj)
+                        except ValueError:
+                            print(f"invalid JSONL line skipped: {line[:120].decode('utf-8', 'replace')}", file=sys.stderr)
+                    new_offset = end
 
     write_offset(offset_path, new_offset)
     return out, new_offset
@@ -165,12 +184,9 @@ def main() -> int:
     duplicates = 0
 
     if args.stdin_jsonl:
-        for raw_obj in iter_jsonl_from_stdin():
-            event = normalize(raw_obj, account=args.account)
-            if publish_event(conn, event):
-                published += 1
-            else:
-                duplicates += 1
+        events = [normalize(raw_obj, account=args.account) for raw_obj in iter_jsonl_from_stdin()]
+        published, duplicates = publish_events(conn, events)
+        close_conn(conn)
         print(json.dumps({"published": published, "duplicates": duplicates}))
         return 0
 
@@ -179,17 +195,16 @@ def main() -> int:
 
     while True:
         batch, _ = ingest_file_once(in_path, offset_path)
-        for raw_obj in batch:
-            event = normalize(raw_obj, account=args.account)
-            if publish_event(conn, event):
-                published += 1
-            else:
-                duplicates += 1
+        events = [normalize(raw_obj, account=args.account) for raw_obj in batch]
+        batch_published, batch_duplicates = publish_events(conn, events)
+        published += batch_published
+        duplicates += batch_duplicates
 
         if not args.follow:
             break
         time.sleep(max(0.2, args.poll_ms / 1000.0))
 
+    close_conn(conn)
     print(json.dumps({"published": published, "duplicates": duplicates}))
     return 0
 
@@ -2,7 +2,8 @@
 """Bridge Signal daemon journald logs -> normalized-ish JSONL ingress.
 
 Reads new logs from signal-cli-daemon.service using journal cursor state and emits
-JSON objects to .openclaw/signal_inbound_raw.jsonl via signal_jsonl_ingest.py.
+JSON objects to .openclaw/signal_inbound_raw.jsonl via signal_jsonl_ingest.append_objs
+(in-process, no temp file or second interpreter).
 
 Designed for Phase-1 reliability without opening another signal-cli receive process.
 """
@@ -15,18 +16,41 @@ import re
 import subprocess
 from pathlib import Path
 
+from signal_jsonl_ingest import RAW_JSONL, append_objs
+
 STATE_DIR = Path("/home/james/.openclaw/workspace-sigpro/.openclaw")
 CURSOR_FILE = STATE_DIR / "signal_journal.cursor"
-TMP_JSON_FILE = STATE_DIR / "signal_journal_batch.json"
-INGEST_SCRIPT = Path("/home/james/.openclaw/workspace-sigpro/scripts/signal_jsonl_ingest.py")
 
 ENVELOPE_RE = re.compile(r"Envelope from: .*?\s(\+\d+)\s\(device:\s*(\d+)\)")
 TS_RE = re.compile(r"Timestamp:\s*(\d+)")
-BODY_RE = re.compile(r"\s*Body:\s*(.*)")
-ATTACH_ID_RE = re.compile(r"\s*Id:\s*(\S+)")
-ATTACH_FILE_RE = re.compile(r"\s*Filename:\s*(.*)")
-ATTACH_MIME_RE = re.compile(r"\s*Content-Type:\s*(.*)")
-ATTACH_PATH_RE = re.compile(r"\s*Stored plaintext in:\s*(.*)")
+
+
+def _on_body(current: dict, value: str) -> None:
+    current["message"]["text"] = value
+
+
+def _on_attachment_id(current: dict, value: str) -> None:
+    if value:
+        current["attachments"].append({"id": value.split()[0]})
+
+
+def _attachment_field(field: str):
+    def handler(current: dict, value: str) -> None:
+        if current["attachments"]:
+            current["attachments"][-1][field] = value
+
+    return handler
+
+
+# Detail lines are "<Key>: <value>"; dispatch on the key instead of trying
+# one regex per line type.
+PREFIX_HANDLERS = {
+    "Body": _on_body,
+    "Id": _on_attachment_id,
+    "Filename": _attachment_field("filename"),
+    "Content-Type": _attachment_field("mime_type"),
+    "Stored plaintext in": _attachment_field("path"),
+}
 
 
 def parse_args() -> argparse.Namespace:
@@ -86,7 +110,7 @@ def parse_events(entries: list[dict]) -> tuple[list[dict], str]:
         last_cursor = e.get("__CURSOR") or last_cursor
         msg = str(e.get("MESSAGE") or "")
 
-        m_env = ENVELOPE_RE.search(msg)
+        m_env = ENVELOPE_RE.search(msg) if "Envelope from:" in msg else None
         if m_env:
             # envelope starts context but we wait for timestamp to finalize event id
             if current and current.get("source_message_id"):
@@ -98,7 +122,7 @@ def parse_events(entries: list[dict]) -> tuple[list[dict], str]:
             }
             continue
 
-        m_ts = TS_RE.search(msg)
+        m_ts = TS_RE.search(msg) if "Timestamp:" in msg else None
         if m_ts:
             if current and current.get("source_message_id"):
                 flush()
@@ -113,33 +137,10 @@ def parse_events(entries: list[dict]) -> tuple[list[dict], str]:
         if not current:
             continue
 
-        m_body = BODY_RE.search(msg)
-        if m_body:
-            current["message"]["text"] = m_body.group(1).strip()
-            continue
-
-        if "Attachments:" in msg:
-            continue
-
-        m_id = ATTACH_ID_RE.search(msg)
-        if m_id:
-            current["attachments"].append({"id": m_id.group(1)})
-            continue
-
-        m_fn = ATTACH_FILE_RE.search(msg)
-        if m_fn and current["attachments"]:
-            current["attachments"][-1]["filename"] = m_fn.group(1).strip()
-            continue
-
-        m_mt = ATTACH_MIME_RE.search(msg)
-        if m_mt and current["attachments"]:
-            current["attachments"][-1]["mime_type"] = m_mt.group(1).strip()
-            continue
-
-        m_path = ATTACH_PATH_RE.search(msg)
-        if m_path and current["attachments"]:
-            current["attachments"][-1]["path"] = m_path.group(1).strip()
-            continue
+        key, sep, rest = msg.strip().partition(":")
+        handler = PREFIX_HANDLERS.get(key) if sep else None
+        if handler:
+            handler(current, rest.strip())
 
     flush()
     return events, last_cursor
@@ -161,10 +162,8 @@ def main() -> int:
     if not events:
         return 0
 
-    TMP_JSON_FILE.parent.mkdir(parents=True, exist_ok=True)
-    TMP_JSON_FILE.write_text(json.dumps(events, ensure_ascii=False))
-    proc = subprocess.run(["python3", str(INGEST_SCRIPT), "--in-file", str(TMP_JSON_FILE)])
-    return proc.returncode
+    append_objs(events, RAW_JSONL)
+    return 0
 
 
 if __name__ == "__main__":
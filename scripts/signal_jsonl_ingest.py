@@ -2,7 +2,9 @@
 """Append normalized/raw Signal inbound JSON events to shared JSONL ingress file.
 
 Use this as the single append point from any upstream bridge.
-It enforces atomic append with a file lock to avoid line corruption.
+Lines are appended with O_APPEND writes of at most ATOMIC_WRITE_MAX bytes, each
+holding whole lines, so concurrent writers never interleave inside a line; only
+a single line larger than that falls back to the advisory file lock.
 """
 
 from __future__ import annotations
@@ -12,10 +14,14 @@ import json
 import os
 import sys
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from signal_event_store import json_dumpb, json_loads
 
 STATE_DIR = Path("/home/james/.openclaw/workspace-sigpro/.openclaw")
 RAW_JSONL = STATE_DIR / "signal_inbound_raw.jsonl"
 LOCK_FILE = STATE_DIR / "signal_inbound_raw.write.lock"
+ATOMIC_WRITE_MAX = 4096
 
 
 def parse_args() -> argparse.Namespace:
@@ -34,54 +40,100 @@ def lock_fd(path: Path) -> int:
     return fd
 
 
-def parse_input_text(text: str):
-    text = text.strip()
-    if not text:
-        return []
-
-    # Try whole-document JSON first.
+def _parse_document(data: bytes) -> Iterator[dict]:
+    # Whole-document JSON first (array or pretty-printed object), then JSONL.
     try:
-        obj = json.loads(text)
-        if isinstance(obj, dict):
-            return [obj]
-        if isinstance(obj, list):
-            return [x for x in obj if isinstance(x, dict)]
+        obj = json_loads(data)
     except json.JSONDecodeError:
-        pass
-
-    # Fallback: JSONL
-    out = []
-    for line in text.splitlines():
+        obj = None
+    if isinstance(obj, dict):
+        yield obj
+        return
+    if isinstance(obj, list):
+        yield from (x for x in obj if isinstance(x, dict))
+        return
+    yield from _parse_lines(data.splitlines())
+
+
+def _parse_lines(lines: Iterable[bytes]) -> Iterator[dict]:
+    for line in lines:
         s = line.strip()
         if not s:
             continue
         try:
-            obj = json.loads(s)
+            obj = json_loads(s)
             if isinstance(obj, dict):
-                out.append(obj)
+                yield obj
         except json.JSONDecodeError:
             continue
-    return out
+
+
+def iter_objs(fileobj: BinaryIO) -> Iterator[dict]:
+    """Yield JSON objects from a JSONL stream one line at a time.
+
+    Inputs that are a single JSON document (an array, or an object spanning
+    several lines) are detected from the first non-blank line and parsed whole.
+    """
+    for first in fileobj:
+        s = first.strip()
+        if not s:
+            continue
+        if not s.startswith(b"["):
+            try:
+                obj = json_loads(s)
+            except json.JSONDecodeError:
+                obj = None
+            else:
+                if isinstance(obj, dict):
+                    yield obj
+                yield from _parse_lines(fileobj)
+                return
+        yield from _parse_document(first + fileobj.read())
+        return
+
+
+def _write_all(fd: int, data: bytes | bytearray) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def append_objs(objs: Iterable[dict], out_path: Path = RAW_JSONL) -> int:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    appended = 0
+    buf = bytearray()
+    try:
+        for obj in objs:
+            line = json_dumpb(obj) + b"\n"
+            appended += 1
+            if len(buf) + len(line) > ATOMIC_WRITE_MAX and buf:
+                _write_all(fd, buf)
+                buf.clear()
+            if len(line) > ATOMIC_WRITE_MAX:
+                lock = lock_fd(LOCK_FILE)
+                try:
+                    _write_all(fd, line)
+                finally:
+                    os.close(lock)
+                continue
+            buf += line
+        if buf:
+            _write_all(fd, buf)
+    finally:
+        os.close(fd)
+    return appended
 
 
 def main() -> int:
     args = parse_args()
-    if args.in_file:
-        text = Path(args.in_file).read_text(encoding="utf-8")
-    else:
-        text = sys.stdin.read()
-
-    objs = parse_input_text(text)
     out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    fd = lock_fd(LOCK_FILE)
-    _ = fd
-    with out_path.open("a", encoding="utf-8") as f:
-        for obj in objs:
-            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    src = Path(args.in_file).open("rb") if args.in_file else sys.stdin.buffer
+    with src:
+        appended = append_objs(iter_objs(src), out_path)
 
-    print(json.dumps({"appended": len(objs), "out": str(out_path)}))
+    print(json.dumps({"appended": appended, "out": str(out_path)}))
     return 0
 
 
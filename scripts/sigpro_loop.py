@@ -1,138 +1,207 @@
 #!/usr/bin/env python3
 """SigPro live loop: Signal voice ingestion + WhatsApp OOB auth + execution.
 
-Run this script periodically (e.g., cron). Each run does:
-1) If a new Signal attachment exists: transcribe, generate code, notify WhatsApp/Signal, store pending transcript.
+Run this script periodically (e.g., cron), or once with --follow to keep it up. Each pass does:
+1) Transcribe new Signal attachments (a few at a time) into a queue. If no request is pending,
+   take the oldest queued transcript, generate code, notify WhatsApp/Signal, store pending
+   transcript. Later transcripts wait in the queue until it is used or expires.
 2) Else, check for a new 4-digit Signal text code and validate.
 3) On valid code: execute pending transcript against the main interpreter and send a concise Signal summary.
+
+With --follow, the attachment directory is watched via its mtime, which changes
+whenever a file is added, and the dispatcher is only polled for codes while a
+transcript is pending. A voice file is only processed once it has not been
+modified for ATTACHMENT_SETTLE_SEC, so partially written files are skipped.
 """
 
 from __future__ import annotations
 
-import json
-import re
+import argparse
+import os
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
+import auth_manager
+import openclaw_client
+import transcribe_elevenlabs
+from signal_event_store import json_dumpb, json_loads
+
 VOICE_EXTENSIONS = {".m4a", ".opus", ".ogg", ".oga", ".aac", ".mp3", ".wav", ".webm"}
+_VOICE_SUFFIX_TUPLE = tuple(VOICE_EXTENSIONS)
 
 ATTACHMENT_DIR = Path("/home/james/.local/share/signal-cli/attachments")
 STATE_DIR = Path("/home/james/.openclaw/workspace-sigpro/.openclaw")
 LAST_ATTACHMENT_FILE = STATE_DIR / "last_processed_attachment.txt"
 LAST_SIGNAL_MSG_FILE = STATE_DIR / "last_processed_signal_message.txt"
 PENDING_FILE = STATE_DIR / "pending_transcript.json"
-AUTH_FAILURE_LOG = STATE_DIR / "auth_failures.log"
+QUEUE_FILE = STATE_DIR / "queued_transcripts.json"
 
-TRANSCRIBE_SCRIPT = Path("/home/james/.openclaw/workspace-sigpro/scripts/transcribe_elevenlabs.py")
-AUTH_SCRIPT = Path("/home/james/.openclaw/workspace-sigpro/scripts/auth_manager.py")
 DISPATCHER_SCRIPT = Path("/home/james/.openclaw/workspace/shared/signal_dispatcher.py")
 
 TARGET_USER = "+19412907826"
-# Strict reply-code format: exactly 4 digits, nothing else.
-CODE_RE = re.compile(r"^([0-9]{4})$")
+# Concurrent ElevenLabs uploads when several voice notes are waiting.
+TRANSCRIBE_CONCURRENCY = 2
+
+
+# --follow: how often to look for a code reply while a transcript is pending,
+# and the rescan interval when nothing appears to have changed.
+CODE_POLL_SEC = 2.0
+FALLBACK_POLL_SEC = 30.0
+# A voice file is only picked up once its mtime is this old, so one that
+# signal-cli is still writing is left for a later pass.
+ATTACHMENT_SETTLE_SEC = 2.0
+
+
+# Set by _find_unprocessed_attachments() when it held back a file that is still
+# settling, so --follow rescans once the settle window has passed.
+_attachments_settling = False
+
+
+def _is_auth_code(text: str) -> bool:
+    # Strict reply-code format: exactly 4 ASCII digits, nothing else.
+    return len(text) == 4 and text.isascii() and text.isdigit()
 
 
 def _ensure_state_dir() -> None:
     STATE_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def _run(cmd: list[str]) -> subprocess.CompletedProcess[str]:
-    return subprocess.run(cmd, capture_output=True, text=True)
+def _run(cmd: list[str]) -> subprocess.CompletedProcess[bytes]:
+    # stdout is left as bytes; json_loads parses it without a decode/strip pass.
+    return subprocess.run(cmd, capture_output=True)
 
 
 def _read_text(path: Path) -> str:
-    return path.read_text().strip() if path.exists() else ""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
 
 
-def _write_text(path: Path, value: str) -> None:
-    _ensure_state_dir()
-    path.write_text(value)
+def _atomic_write(path: Path, data: bytes) -> None:
+    # Write-then-rename so a kill mid-write never leaves a torn state file;
+    # skip the write entirely when the content is already current.
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    except FileNotFoundError:
+        pass
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
 
 
-def _log_auth_failure(reason: str, code: str | None = None, message_id: str | None = None) -> None:
+def _write_text(path: Path, value: str) -> None:
     _ensure_state_dir()
-    entry = {
-        "ts": int(time.time()),
-        "reason": reason,
-        "code": code,
-        "message_id": message_id,
-    }
-    with AUTH_FAILURE_LOG.open("a") as f:
-        f.write(json.dumps(entry) + "\n")
+    _atomic_write(path, value.encode("utf-8"))
 
 
 def _send_message(channel: str, target: str, text: str) -> bool:
-    proc = _run([
-        "openclaw",
-        "message",
-        "send",
-        "--channel",
-        channel,
-        "--target",
-        target,
-        "--message",
-        text,
-    ])
-    return proc.returncode == 0
+    return openclaw_client.send_message(channel, target, text)
 
 
-def _find_newest_unprocessed_attachment() -> Path | None:
-    if not ATTACHMENT_DIR.exists():
-        return None
+def _read_attachment_cursor() -> tuple[int | None, str]:
+    # Cursor format is "<st_mtime_ns>\t<name>"; older state files hold just the name.
+    raw = _read_text(LAST_ATTACHMENT_FILE)
+    mtime_ns, sep, name = raw.partition("\t")
+    if sep and mtime_ns.isdigit():
+        return int(mtime_ns), name
+    return None, raw
 
-    files = [
-        p
-        for p in ATTACHMENT_DIR.glob("*")
-        if p.is_file() and p.suffix.lower() in VOICE_EXTENSIONS
-    ]
-    if not files:
-        return None
 
-    files.sort(key=lambda p: p.stat().st_mtime)
-    last_name = _read_text(LAST_ATTACHMENT_FILE)
+def _write_attachment_cursor(mtime_ns: int, name: str) -> None:
+    _write_text(LAST_ATTACHMENT_FILE, f"{mtime_ns}\t{name}")
 
-    if not last_name:
-        # First run initialization: mark latest and do not process historical backlog.
-        _write_text(LAST_ATTACHMENT_FILE, files[-1].name)
-        return None
 
-    # Return the first file after last processed (oldest-first progression).
-    seen_last = False
-    for p in files:
-        if seen_last:
-            return p
-        if p.name == last_name:
-            seen_last = True
+def _is_voice_name(name: str) -> bool:
+    return name.lower().endswith(_VOICE_SUFFIX_TUPLE)
 
-    # If we found the last processed file and nothing newer exists, nothing to do.
-    if seen_last:
-        return None
 
-    # If state points to deleted/unknown file, process only newest to avoid replay storms.
-    return files[-1]
+def _find_unprocessed_attachments() -> list[tuple[int, Path]]:
+    """Return (st_mtime_ns, path) for settled voice files newer than the cursor, oldest first."""
+    global _attachments_settling
+    _attachments_settling = False
+    # Each file is stat'ed once, and only the returned files are wrapped in
+    # Path objects. A file deleted between the scan and its stat() is skipped.
+    stamped: list[tuple[int, str, str]] = []
+    try:
+        with os.scandir(ATTACHMENT_DIR) as it:
+            for e in it:
+                if not (_is_voice_name(e.name) and e.is_file()):
+                    continue
+                try:
+                    stamped.append((e.stat().st_mtime_ns, e.name, e.path))
+                except FileNotFoundError:
+                    continue
+    except FileNotFoundError:
+        return []
+    if not stamped:
+        return []
+
+    settled_before_ns = time.time_ns() - int(ATTACHMENT_SETTLE_SEC * 1e9)
+    cursor_ns, last_name = _read_attachment_cursor()
+    if cursor_ns is None:
+        newest = max(stamped)
+        if not last_name:
+            # First run initialization: mark latest and do not process historical backlog.
+            _write_attachment_cursor(newest[0], newest[1])
+            return []
+
+        # Legacy name-only cursor: resolve it to that file's mtime.
+        last = next((s for s in stamped if s[1] == last_name), None)
+        if last is None:
+            # If state points to deleted/unknown file, process only newest to avoid replay storms.
+            if newest[0] > settled_before_ns:
+                _attachments_settling = True
+                return []
+            return [(newest[0], Path(newest[2]))]
+        cursor_ns = last[0]
+
+    # Order by (mtime, name) so files sharing the cursor's mtime (coarse
+    # timestamps, back-to-back attachments) are still picked up after it.
+    cursor = (cursor_ns, last_name)
+    pending = sorted(s for s in stamped if (s[0], s[1]) > cursor)
+
+    # Stop at the first file modified within the settle window: it may still be
+    # mid-write, and the cursor must not move past it before it is complete.
+    ready: list[tuple[int, Path]] = []
+    for mtime_ns, _, path in pending:
+        if mtime_ns > settled_before_ns:
+            _attachments_settling = True
+            break
+        ready.append((mtime_ns, Path(path)))
+    return ready
 
 
 def _transcribe(attachment: Path) -> str | None:
-    proc = _run(["python3", str(TRANSCRIBE_SCRIPT), str(attachment)])
-    if proc.returncode != 0:
+    try:
+        _, text = transcribe_elevenlabs.transcribe(attachment)
+    except (transcribe_elevenlabs.TranscriptionError, OSError):
         return None
+    return text.strip() or None
 
-    txt_path = Path(proc.stdout.strip())
-    if not txt_path.exists():
-        return None
 
-    text = txt_path.read_text().strip()
-    return text or None
+def _transcribe_many(attachments: list[Path]) -> list[str | None]:
+    # A backlog (e.g. after an outage) is uploaded a few at a time rather than
+    # one after another; results come back in input order.
+    if len(attachments) == 1:
+        return [_transcribe(attachments[0])]
+    with ThreadPoolExecutor(max_workers=TRANSCRIBE_CONCURRENCY) as pool:
+        return list(pool.map(_transcribe, attachments))
 
 
 def _generate_auth_code() -> str | None:
-    proc = _run(["python3", str(AUTH_SCRIPT), "generate"])
-    code = proc.stdout.strip()
-    if proc.returncode != 0 or not re.fullmatch(r"\d{4}", code):
+    try:
+        code = auth_manager.generate()
+    except OSError:
         return None
-    return code
+    return code if _is_auth_code(code) else None
 
 
 def _store_pending_transcript(transcript: str, source_file: str) -> None:
@@ -143,37 +212,108 @@ def _store_pending_transcript(transcript: str, source_file: str) -> None:
         "created_at": int(time.time()),
         "expires_in_sec": 300,
     }
-    PENDING_FILE.write_text(json.dumps(payload, indent=2))
+    _atomic_write(PENDING_FILE, json_dumpb(payload))
+
+
+def _pending_is_active() -> bool:
+    try:
+        pending = json_loads(PENDING_FILE.read_bytes())
+        expires_at = int(pending["created_at"]) + int(pending["expires_in_sec"])
+    except FileNotFoundError:
+        return False
+    except (ValueError, KeyError, TypeError):
+        # Unreadable pending state can never be authorized; drop it.
+        _clear_pending()
+        return False
+
+    if time.time() >= expires_at:
+        auth_manager.log_failure("pending_transcript_expired")
+        _clear_pending()
+        return False
+    return True
 
 
-def _process_new_voice_note() -> bool:
-    voice_file = _find_newest_unprocessed_attachment()
-    if not voice_file:
+def _read_queue() -> list[dict[str, str]]:
+    try:
+        queue = json_loads(QUEUE_FILE.read_bytes())
+    except FileNotFoundError:
+        return []
+    except ValueError:
+        # Unreadable queue state: drop it rather than wedge the loop.
+        return []
+    if not isinstance(queue, list):
+        return []
+    return [q for q in queue if isinstance(q, dict) and isinstance(q.get("transcript"), str)]
+
+
+def _write_queue(queue: list[dict[str, str]]) -> None:
+    if queue:
+        _ensure_state_dir()
+        _atomic_write(QUEUE_FILE, json_dumpb(queue))
+    else:
+        QUEUE_FILE.unlink(missing_ok=True)
+
+
+def _transcribe_ahead() -> bool:
+    """Transcribe settled new voice notes onto the queue; returns True if any were taken."""
+    found = _find_unprocessed_attachments()
+    if not found:
         return False
 
-    transcript = _transcribe(voice_file)
-    _write_text(LAST_ATTACHMENT_FILE, voice_file.name)
-    if not transcript:
-        return True
+    transcripts = _transcribe_many([path for _, path in found])
+    queue = _read_queue()
+    queue.extend(
+        {"transcript": transcript, "source_file": path.name}
+        for (_, path), transcript in zip(found, transcripts)
+        if transcript
+    )
+    # Queue before cursor: a crash in between re-transcribes a note rather than losing it.
+    _write_queue(queue)
+    # Reuse the scanned mtime: the file may already be gone again.
+    mtime_ns, last = found[-1]
+    _write_attachment_cursor(mtime_ns, last.name)
+    return True
+
+
+def _promote_queued_transcript() -> bool:
+    queue = _read_queue()
+    if not queue:
+        return False
+    item = queue.pop(0)
+    _write_queue(queue)
 
     code = _generate_auth_code()
     if not code:
-        _log_auth_failure("code_generation_failed")
+        auth_manager.log_failure("code_generation_failed")
         return True
 
-    _store_pending_transcript(transcript, voice_file.name)
+    _store_pending_transcript(item["transcript"], str(item.get("source_file") or ""))
 
     wa_text = f"SigPro Auth Code: {code} (Valid for 5 mins for your Signal voice request)"
-    _send_message("whatsapp", TARGET_USER, wa_text)
-
     signal_text = (
         "Voice request transcribed. Please enter the 4-digit code sent to your "
         "WhatsApp to authorize execution."
     )
-    _send_message("signal", TARGET_USER, signal_text)
+    messages = [
+        ("whatsapp", TARGET_USER, wa_text),
+        ("signal", TARGET_USER, signal_text),
+    ]
+    for (channel, _, _), sent in zip(messages, openclaw_client.send_bulk(messages)):
+        if not sent:
+            auth_manager.log_failure(f"notify_failed:{channel}", code=code)
     return True
 
 
+def _process_new_voice_notes() -> bool:
+    # Uploads run regardless of the pending request, so the next transcript is
+    # ready the moment it resolves. auth_manager holds a single code, though, so
+    # only one request is pending at a time; the rest wait in the queue.
+    transcribed = _transcribe_ahead()
+    if _pending_is_active():
+        return transcribed
+    return _promote_queued_transcript() or transcribed
+
+
 def _extract_messages(payload: Any) -> list[dict[str, Any]]:
     # CLI payload shape varies by provider/runtime. Normalize to list[dict].
     if isinstance(payload, list):
@@ -204,13 +344,14 @@ def _read_latest_signal_code_message() -> tuple[str, str] | None:
         return None
 
     try:
-        payload = json.loads(proc.stdout.strip())
+        payload = json_loads(proc.stdout)
         events = payload.get("events", []) if isinstance(payload, dict) else []
-    except json.JSONDecodeError:
+    except ValueError:
         return None
 
-    newest_code_msg: tuple[str, str] | None = None
-    for ev in events:
+    # The dispatcher returns events oldest first, so walk from the end and stop
+    # at the first (i.e. newest) valid code.
+    for ev in reversed(events):
         # Strict inbox scope: only self note-to-self style messages.
         sender = str(ev.get("from") or "").strip()
         target = str(ev.get("target") or "").strip()
@@ -223,87 +364,35 @@ def _read_latest_signal_code_message() -> tuple[str, str] | None:
         text = str(ev.get("text") or "").strip()
 
         # Ignore anything that is not exactly ####.
-        match = CODE_RE.match(text)
-        if match and msg_id:
-            newest_code_msg = (msg_id, match.group(1))
+        if msg_id and _is_auth_code(text):
+            return msg_id, text
 
-    return newest_code_msg
+    return None
 
 
 def _validate_code(code: str) -> tuple[bool, str]:
-    proc = _run(["python3", str(AUTH_SCRIPT), "validate", code])
-    if proc.returncode != 0:
-        return False, "Internal validation error."
     try:
-        payload = json.loads(proc.stdout.strip())
-    except json.JSONDecodeError:
-        return False, "Internal validation parse error."
-    return bool(payload.get("ok")), str(payload.get("message") or "Invalid code.")
-
-
-def _extract_text_candidates(obj: Any) -> list[str]:
-    out: list[str] = []
-
-    def walk(v: Any) -> None:
-        if isinstance(v, dict):
-            for k in ("final", "reply", "text", "message", "content", "output"):
-                val = v.get(k)
-                if isinstance(val, str) and val.strip():
-                    out.append(val.strip())
-            for _, child in v.items():
-                walk(child)
-        elif isinstance(v, list):
-            for item in v:
-                walk(item)
-
-    walk(obj)
-    dedup: list[str] = []
-    seen: set[str] = set()
-    for s in out:
-        if s not in seen:
-            seen.add(s)
-            dedup.append(s)
-    return dedup
-
-
-def _best_assistant_text(payload: dict[str, Any]) -> str:
-    for k in ("final", "reply", "text", "message"):
-        v = payload.get(k)
-        if isinstance(v, str) and v.strip():
-            return v.strip()
-
-    candidates = _extract_text_candidates(payload)
-    for c in candidates:
-        if c.lower() not in {"execution completed.", "execution completed"}:
-            return c
-    return candidates[0] if candidates else ""
+        return auth_manager.validate(code)
+    except OSError:
+        return False, "Internal validation error."
+
+
+def _clear_pending() -> None:
+    PENDING_FILE.unlink(missing_ok=True)
 
 
 def _execute_in_main(transcript: str) -> str:
     # Target the main interpreter session key directly via sessions send.
     text = f"SigPro Authorized Signal Voice Request:\n{transcript}"
 
-    proc = _run([
-        "openclaw",
-        "agent",
-        "--agent",
-        "main",
-        "--message",
-        text,
-        "--json",
-        "--timeout",
-        "120",
-    ])
-
-    if proc.returncode != 0:
+    ok, payload = openclaw_client.run_agent("main", text, timeout_sec=120, accept=openclaw_client.has_final_text)
+    if not ok:
         return "Execution was triggered, but no assistant output was returned."
 
-    try:
-        payload = json.loads(proc.stdout)
-    except json.JSONDecodeError:
+    if not isinstance(payload, dict):
         return "Execution completed, but assistant output could not be parsed."
 
-    assistant_text = _best_assistant_text(payload)
+    assistant_text = openclaw_client.best_assistant_text(payload)
     if not assistant_text:
         return "Execution completed, but no assistant text was returned."
 
@@ -320,20 +409,26 @@ def _process_signal_auth_code() -> bool:
         return False
 
     message_id, code = code_msg
+    # The same code message is re-read on every tick until it is cleaned up;
+    # each message is validated (and reported) once, across runs.
+    if message_id == _read_text(LAST_SIGNAL_MSG_FILE):
+        return False
+
     ok, reason = _validate_code(code)
+    _write_text(LAST_SIGNAL_MSG_FILE, message_id)
     if not ok:
-        _log_auth_failure(reason=reason, code=code, message_id=message_id)
+        auth_manager.log_failure(reason=reason, code=code, message_id=message_id)
         _send_message("signal", TARGET_USER, f"Auth failed: {reason}")
         return True
 
     try:
-        pending = json.loads(PENDING_FILE.read_text())
+        pending = json_loads(PENDING_FILE.read_bytes())
         transcript = str(pending.get("transcript") or "").strip()
     except Exception:
         transcript = ""
 
     if not transcript:
-        _log_auth_failure(reason="pending_transcript_missing_or_invalid", code=code, message_id=message_id)
+        auth_manager.log_failure(reason="pending_transcript_missing_or_invalid", code=code, message_id=message_id)
         _send_message("signal", TARGET_USER, "Auth accepted, but no pending transcript was found.")
         return True
 
@@ -346,23 +441,72 @@ def _process_signal_auth_code() -> bool:
     _send_message("signal", TARGET_USER, formatted[:3500])
 
     try:
-        PENDING_FILE.unlink(missing_ok=True)
+        _clear_pending()
     except Exception:
         pass
 
     return True
 
 
-def main() -> int:
-    _ensure_state_dir()
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="SigPro voice ingestion + OOB auth loop")
+    p.add_argument("--follow", action="store_true", help="Keep running and wake on new attachments")
+    p.add_argument("--poll-ms", type=int, default=200, help="Attachment dir check interval in ms for --follow")
+    return p.parse_args()
 
-    # Priority: if a new voice note appears, process it first and stop.
-    if _process_new_voice_note():
+
+def _attachment_dir_version() -> int:
+    # A directory's mtime changes whenever an entry is created or renamed into it.
+    try:
+        return os.stat(ATTACHMENT_DIR).st_mtime_ns
+    except FileNotFoundError:
         return 0
 
+
+def _wait_for_attachment(last_version: int, poll_ms: int, max_wait_sec: float) -> int:
+    """Sleep until the attachment dir changes or max_wait_sec elapses; returns the new version."""
+    deadline = time.monotonic() + max_wait_sec
+    while time.monotonic() < deadline:
+        version = _attachment_dir_version()
+        if version != last_version:
+            return version
+        time.sleep(poll_ms / 1000.0)
+    return _attachment_dir_version()
+
+
+def run_once() -> None:
+    # Priority: if a new voice note appears, process it first and stop.
+    if _process_new_voice_notes():
+        return
+
     # No new voice ingestion, so we can accept a Signal code for pending transcript.
     _process_signal_auth_code()
-    return 0
+
+
+def main() -> int:
+    args = parse_args()
+    _ensure_state_dir()
+
+    if not args.follow:
+        run_once()
+        return 0
+
+    # Read the version before scanning so files that land mid-pass wake us.
+    version = _attachment_dir_version()
+    while True:
+        while _process_new_voice_notes():
+            pass
+        if _process_signal_auth_code() and not PENDING_FILE.exists():
+            # The pending request was resolved; let the next voice note go pending now.
+            continue
+
+        if _attachments_settling:
+            max_wait = ATTACHMENT_SETTLE_SEC
+        elif PENDING_FILE.exists():
+            max_wait = CODE_POLL_SEC
+        else:
+            max_wait = FALLBACK_POLL_SEC
+        version = _wait_for_attachment(version, args.poll_ms, max_wait)
 
 
 if __name__ == "__main__":
@@ -4,29 +4,54 @@
 Usage:
   python3 scripts/transcribe_elevenlabs.py /path/to/file.m4a
   python3 scripts/transcribe_elevenlabs.py /path/to/file.m4a --json --out /tmp/out.json
+
+Other scripts can import it and call transcribe() directly.
 """
 
 from __future__ import annotations
 
 import argparse
+import http.client
+import itertools
 import json
+import mimetypes
 import os
-import subprocess
 import sys
+import threading
+import uuid
 from pathlib import Path
 
+from rate_limit import TokenBucket, TransientError, parse_retry_after, retry
+
 
-def load_dotenv(path: Path) -> None:
+def _read_dotenv(path: Path) -> dict[str, str]:
+    values: dict[str, str] = {}
     if not path.exists():
-        return
+        return values
     for raw in path.read_text().splitlines():
         line = raw.strip()
         if not line or line.startswith("#") or "=" not in line:
             continue
         k, v = line.split("=", 1)
-        k = k.strip()
-        v = v.strip().strip('"').strip("'")
-        os.environ.setdefault(k, v)
+        values[k.strip()] = v.strip().strip('"').strip("'")
+    return values
+
+
+ENV_FILE = Path(__file__).resolve().parents[1] / ".env"
+
+# Read once at import; in-process callers transcribe many notes per process.
+# .env values stay private to this module rather than going into os.environ,
+# so the key is not inherited by the subprocesses callers spawn.
+_DOTENV = _read_dotenv(ENV_FILE)
+
+
+def _setting(name: str, default: str = "") -> str:
+    # A variable set in the real environment wins over .env.
+    return os.environ.get(name, _DOTENV.get(name, default))
+
+
+_API_KEY = _setting("ELEVENLABS_API_KEY").strip()
+_DEFAULT_MODEL_ID = _setting("ELEVENLABS_SPEECH_MODEL_ID", "scribe_v1")
 
 
 def parse_args() -> argparse.Namespace:
@@ -36,62 +61,142 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--json", action="store_true", help="Write raw JSON response")
     p.add_argument(
         "--model-id",
-        default=os.getenv("ELEVENLABS_SPEECH_MODEL_ID", "scribe_v1"),
+        default=_DEFAULT_MODEL_ID,
         help="ElevenLabs speech model id (default: scribe_v1)",
     )
     p.add_argument("--language", help="Optional language code (e.g., en)")
     return p.parse_args()
 
 
-def main() -> int:
-    load_dotenv(Path(__file__).resolve().parents[1] / ".env")
-    args = parse_args()
+STT_HOST = "api.elevenlabs.io"
+STT_PATH = "/v1/speech-to-text"
+STT_TIMEOUT_SEC = 120
 
-    audio_path = Path(args.audio_file).expanduser().resolve()
-    if not audio_path.exists():
-        print(f"Audio file not found: {audio_path}", file=sys.stderr)
-        return 2
-
-    api_key = os.getenv("ELEVENLABS_API_KEY", "").strip()
-    if not api_key:
-        print("ELEVENLABS_API_KEY is required", file=sys.stderr)
-        return 2
-
-    output_path = Path(args.out) if args.out else audio_path.with_suffix(".txt")
-
-    cmd = [
-        "curl",
-        "-sS",
-        "-X",
-        "POST",
-        "https://api.elevenlabs.io/v1/speech-to-text",
-        "-H",
-        f"xi-api-key: {api_key}",
-        "-F",
-        f"model_id={args.model_id}",
-        "-F",
-        f"file=@{audio_path}",
-    ]
-
-    if args.language:
-        cmd.extend(["-F", f"language_code={args.language}"])
+# Paces uploads to the free-tier limit of 2 requests/sec.
+_EL_BUCKET = TokenBucket(rate=2.0, capacity=2)
+
+# One connection per thread, kept open across transcribe() calls so in-process
+# callers reuse the TLS session; http.client connections are not thread-safe.
+_local = threading.local()
 
+
+def _multipart_parts(fields: dict[str, str], audio_path: Path, boundary: str) -> tuple[bytes, bytes]:
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode("utf-8")
+        for k, v in fields.items()
+    )
+    mime = mimetypes.guess_type(audio_path.name)[0] or "application/octet-stream"
+    filename = audio_path.name.replace('"', "%22")
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {mime}\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return head, tail
+
+
+# Throttling and server-side failures are retried; other statuses are final.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Connection refused/reset/aborted, broken pipe, or the server closing a kept-alive
+# socket (http.client.RemoteDisconnected is a ConnectionError). Timeouts are
+# deliberately absent: after a read timeout the upload may still be processed
+# (and billed), and retrying could block the caller for many minutes.
+RETRYABLE_CONN_ERRORS = (ConnectionError,)
+
+
+def _post_speech_to_text(api_key: str, fields: dict[str, str], audio_path: Path) -> tuple[int, bytes]:
+    """POST a multipart upload, streaming the audio file from disk; returns (status, body)."""
     try:
-        proc = subprocess.run(cmd, check=False, capture_output=True, text=True)
-    except FileNotFoundError:
-        print("curl is required but not found", file=sys.stderr)
-        return 2
+        return _post_speech_to_text_once(api_key, fields, audio_path)
+    except TransientError as e:
+        if e.result is None:
+            raise
+        # Out of retries on a 429/5xx: hand the last response back as usual.
+        return e.result
+
+
+@retry(retry_on=(TransientError, *RETRYABLE_CONN_ERRORS))
+def _post_speech_to_text_once(api_key: str, fields: dict[str, str], audio_path: Path) -> tuple[int, bytes]:
+    boundary = uuid.uuid4().hex
+    head, tail = _multipart_parts(fields, audio_path, boundary)
+    headers = {
+        "xi-api-key": api_key,
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(len(head) + audio_path.stat().st_size + len(tail)),
+    }
+
+    reused = getattr(_local, "conn", None) is not None
+    while True:
+        conn = getattr(_local, "conn", None)
+        if conn is None:
+            conn = _local.conn = http.client.HTTPSConnection(STT_HOST, timeout=STT_TIMEOUT_SEC)
+        _EL_BUCKET.take()
+        try:
+            with audio_path.open("rb") as fh:
+                body = itertools.chain((head,), iter(lambda: fh.read(64 * 1024), b""), (tail,))
+                conn.request("POST", STT_PATH, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            _local.conn = None
+            # A kept-alive connection may have been closed by the server; retry once on a fresh one.
+            if not reused or not isinstance(e, RETRYABLE_CONN_ERRORS):
+                raise
+            reused = False
+            continue
+
+        if resp.status in RETRYABLE_STATUSES:
+            raise TransientError(
+                f"HTTP {resp.status}",
+                retry_after=parse_retry_after(resp.getheader("Retry-After")),
+                result=(resp.status, data),
+            )
+        return resp.status, data
 
-    if proc.returncode != 0:
-        print(proc.stderr.strip() or "curl call failed", file=sys.stderr)
-        return 1
 
-    raw = proc.stdout.strip()
+class TranscriptionError(RuntimeError):
+    def __init__(self, message: str, exit_code: int = 1) -> None:
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def transcribe(
+    audio_file: str | Path,
+    model_id: str | None = None,
+    language: str | None = None,
+    out: str | Path | None = None,
+    as_json: bool = False,
+) -> tuple[Path, str]:
+    """Transcribe an audio file and write the result; returns (output_path, transcript)."""
+    model_id = model_id or _DEFAULT_MODEL_ID
+
+    audio_path = Path(audio_file).expanduser().resolve()
+    if not audio_path.exists():
+        raise TranscriptionError(f"Audio file not found: {audio_path}", exit_code=2)
+
+    if not _API_KEY:
+        raise TranscriptionError("ELEVENLABS_API_KEY is required", exit_code=2)
+
+    output_path = Path(out) if out else audio_path.with_suffix(".txt")
+
+    fields = {"model_id": model_id}
+    if language:
+        fields["language_code"] = language
+
+    try:
+        status, raw = _post_speech_to_text(_API_KEY, fields, audio_path)
+    except (OSError, http.client.HTTPException) as e:
+        raise TranscriptionError(f"ElevenLabs request failed: {e}") from None
+
     try:
         payload = json.loads(raw)
     except json.JSONDecodeError:
-        print(raw, file=sys.stderr)
-        return 1
+        raise TranscriptionError(raw.decode("utf-8", "replace").strip()) from None
+    if not isinstance(payload, dict):
+        raise TranscriptionError(f"Unexpected ElevenLabs response: {payload!r}")
+    if status >= 400 and "error" not in payload:
+        payload = {"error": f"HTTP {status}", **payload}
 
     # ElevenLabs commonly returns {"text": "..."}; keep robust fallbacks.
     text = payload.get("text") or payload.get("transcript") or ""
@@ -100,14 +205,25 @@ def main() -> int:
 
     if "error" in payload:
         output_path.write_text(json.dumps(payload, indent=2) + "\n")
-        print(json.dumps(payload, indent=2), file=sys.stderr)
-        return 1
+        raise TranscriptionError(json.dumps(payload, indent=2))
 
-    if args.json:
+    if as_json:
         output_path.write_text(json.dumps(payload, indent=2) + "\n")
     else:
         output_path.write_text((text or "") + "\n")
 
+    return output_path, text or ""
+
+
+def main() -> int:
+    args = parse_args()
+
+    try:
+        output_path, _ = transcribe(args.audio_file, args.model_id, args.language, args.out, args.json)
+    except TranscriptionError as e:
+        print(str(e), file=sys.stderr)
+        return e.exit_code
+
     print(str(output_path))
     return 0
 